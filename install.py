@@ -15,11 +15,16 @@ import os
 import shutil
 import subprocess
 import sys
+import tarfile
 import tempfile
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Optional
 
 
 REPO_URL = "https://github.com/eamag/papers2dataset.git"
+TARBALL_URL = "https://github.com/eamag/papers2dataset/archive/refs/heads/main.tar.gz"
 SKILL_NAME = "papers2dataset"
 
 
@@ -55,20 +60,26 @@ def check_and_install_uv() -> str:
     return "uv"
 
 
-def install_skill(source_path: Path, target_dir: Path, uv_cmd: str):
-    """Install skill to target directory and setup venv."""
+def install_skill(source_path: Path, target_dir: Path):
+    """Copy skill files to target directory, keeping an existing venv."""
     print(f"\nInstalling to {target_dir}...")
 
     # Create parent if needed
     target_dir.parent.mkdir(parents=True, exist_ok=True)
 
-    # Remove existing
+    # Remove existing files, but keep .venv so it can be reused
     if target_dir.exists():
         print(f"  Removing existing installation at {target_dir}")
-        shutil.rmtree(target_dir)
+        for entry in target_dir.iterdir():
+            if entry.name == ".venv":
+                continue
+            if entry.is_dir() and not entry.is_symlink():
+                shutil.rmtree(entry)
+            else:
+                entry.unlink()
 
     # Copy files
-    shutil.copytree(source_path, target_dir)
+    shutil.copytree(source_path, target_dir, dirs_exist_ok=True)
     print("  Copied skill files.")
 
     # Make scripts executable
@@ -78,20 +89,77 @@ def install_skill(source_path: Path, target_dir: Path, uv_cmd: str):
             if script.is_file() and script.suffix == ".py":
                 script.chmod(script.stat().st_mode | 0o111)
 
-    # Setup venv
-    print(f"  Setting up environment with {uv_cmd}...")
+
+def setup_env(target_dir: Path, uv_cmd: str):
+    """Create the skill venv and install its dependencies, unless already present."""
+    if (target_dir / ".venv").exists():
+        check = subprocess.run(
+            [uv_cmd, "pip", "show", "--quiet", "httpx"],
+            cwd=target_dir,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        if check.returncode == 0:
+            print(f"  Environment in {target_dir} is up to date.")
+            return
+
+    print(f"  Setting up environment in {target_dir} with {uv_cmd}...")
+    try:
+        subprocess.run([uv_cmd, "venv", "--allow-existing"], cwd=target_dir, check=True)
+        subprocess.run([uv_cmd, "pip", "install", "httpx"], cwd=target_dir, check=True)
+    except subprocess.CalledProcessError as e:
+        print(f"  Warning: Error setting up environment in {target_dir}: {e}")
+
+
+def download_skill(tmp_dir: Path) -> Optional[Path]:
+    """Extract skill/ from the GitHub tarball, return None on failure."""
     try:
+        with urllib.request.urlopen(TARBALL_URL, timeout=30) as r:
+            with tarfile.open(fileobj=r, mode="r|gz") as tf:
+                for member in tf:
+                    parts = Path(member.name).parts
+                    if len(parts) > 1 and parts[1] == "skill":
+                        if hasattr(tarfile, "data_filter"):
+                            tf.extract(member, tmp_dir, filter="data")
+                        else:
+                            tf.extract(member, tmp_dir)
+    except (OSError, tarfile.TarError) as e:
+        print(f"Error downloading tarball: {e}")
+        return None
+    found = list(tmp_dir.glob("*/skill"))
+    return found[0] if found else None
+
+
+def clone_skill(clone_path: Path):
+    """Clone only the skill/ subtree, falling back to a plain shallow clone."""
+    try:
+        subprocess.run(
+            [
+                "git",
+                "clone",
+                "--depth",
+                "1",
+                "--filter=blob:none",
+                "--sparse",
+                REPO_URL,
+                str(clone_path),
+            ],
+            check=True,
+            capture_output=True,
+        )
         subprocess.run(
-            [uv_cmd, "venv"], cwd=target_dir, check=True, capture_output=True
+            ["git", "-C", str(clone_path), "sparse-checkout", "set", "skill"],
+            check=True,
+            capture_output=True,
         )
+    except subprocess.CalledProcessError:
+        # older git or a server without partial clone support
+        shutil.rmtree(clone_path, ignore_errors=True)
         subprocess.run(
-            [uv_cmd, "pip", "install", "httpx"],
-            cwd=target_dir,
+            ["git", "clone", "--depth", "1", REPO_URL, str(clone_path)],
             check=True,
             capture_output=True,
         )
-    except subprocess.CalledProcessError as e:
-        print(f"  Warning: Error setting up environment: {e}")
 
 
 def main():
@@ -143,14 +211,14 @@ def main():
             # We can use it directly, but subsequent copytree might fail if we modify it?
             # No, copytree is fine.
         else:
+            print(f"Source: Downloading {TARBALL_URL}...")
+            source_path = download_skill(Path(tmp_dir))
+
+        if source_path is None:
             print(f"Source: Cloning from {REPO_URL}...")
             clone_path = Path(tmp_dir) / "repo"
             try:
-                subprocess.run(
-                    ["git", "clone", "--depth", "1", REPO_URL, str(clone_path)],
-                    check=True,
-                    capture_output=True,
-                )
+                clone_skill(clone_path)
                 source_path = clone_path / "skill"
             except subprocess.CalledProcessError as e:
                 print(f"Error cloning repository: {e.stderr.decode()}")
@@ -165,7 +233,11 @@ def main():
 
         # Install to all targets
         for target in targets:
-            install_skill(source_path, target, uv_cmd)
+            install_skill(source_path, target)
+
+    # venv creation is dominated by uv's own I/O, so set up all targets at once
+    with ThreadPoolExecutor(max_workers=len(targets) or 1) as ex:
+        list(ex.map(lambda t: setup_env(t, uv_cmd), targets))
 
     print()
     print("=" * 40)
@@ -7,7 +7,13 @@ from tqdm.asyncio import tqdm
 
 from papers2dataset.models import generate_project_assets
 from papers2dataset.project import create_project, save_project_assets, load_assets
-from papers2dataset.openalex_client import search_works, fetch_pdf
+from papers2dataset.openalex_client import (
+    search_works,
+    fetch_pdf,
+    fetch_works_batch,
+    close_client,
+    use_works_cache,
+)
 from papers2dataset.extractor import process_one_paper
 from papers2dataset.bfs_queue import BFSQueue
 from papers2dataset.export_csv import publish_to_hf
@@ -19,6 +25,18 @@ def configure_logging(log_level: str = "DEBUG"):
     logger.add(sys.stderr, level=log_level)
 
 
+def run_async(coro):
+    """Run a coroutine, closing the shared HTTP client afterwards."""
+
+    async def runner():
+        try:
+            return await coro
+        finally:
+            await close_client()
+
+    return asyncio.run(runner())
+
+
 @click.group()
 @click.option(
     "--log-level", default="DEBUG", help="Logging level (DEBUG, INFO, WARNING, ERROR)"
@@ -62,8 +80,9 @@ async def search_papers_async(project: str, max_papers: int = 20):
         logger.error(f"Project {project} not found at {project_dir}")
         sys.exit(1)
 
+    use_works_cache(project_dir)
     _, _, _, search_query = load_assets(project_dir)
-    results = search_works(search_query, max_results=max_papers)
+    results = await search_works(search_query, max_results=max_papers)
 
     if not results:
         logger.warning("No papers found")
@@ -88,20 +107,28 @@ async def extract_data_async(
     """Extract data from papers for project."""
     projects_dir = Path("projects")
     project_dir = projects_dir / project
-    q = BFSQueue(project_dir / "bfs_queue.json")
-    if len(q.queue) == 0:
+    q = BFSQueue(project_dir / "bfs_queue.sqlite")
+    use_works_cache(project_dir)
+    if len(q) == 0:
         initial_papers = [x.stem for x in (project_dir / "pdfs").glob("*.pdf")]
         q.add_many(initial_papers)
         logger.info(f"Added {len(initial_papers)} to the queue")
 
-    semaphore = asyncio.Semaphore(max_concurrent)
-    tasks = []
+    pids = []
     for _ in range(num_items):
         pid = q.pop()
         if not pid:
             break
-        tasks.append(process_one_paper(pid, q, project_dir, semaphore))
+        pids.append(pid)
+    papers = await fetch_works_batch(pids)
+
+    semaphore = asyncio.Semaphore(max_concurrent)
+    tasks = [
+        process_one_paper(pid, papers.get(pid), q, project_dir, semaphore)
+        for pid in pids
+    ]
     await tqdm.gather(*tasks)
+    q.flush()
 
 
 @cli.command()
@@ -117,7 +144,7 @@ def create(description: str):
 )
 @click.option("--num-items", default=30, help="Number of papers to process")
 def extract(project: str, max_concurrent: int, num_items: int):
-    asyncio.run(extract_data_async(project, max_concurrent, num_items))
+    run_async(extract_data_async(project, max_concurrent, num_items))
 
 
 @cli.command()
@@ -136,7 +163,7 @@ def export(project: str, public: bool):
 @click.option("--project", required=True, help="Project name")
 @click.option("--max-papers", default=20, help="Maximum number of papers to download")
 def search(project: str, max_papers: int):
-    asyncio.run(search_papers_async(project, max_papers))
+    run_async(search_papers_async(project, max_papers))
 
 
 @cli.command()
@@ -168,7 +195,7 @@ def vibe(description: str):
         repo_url = publish_to_hf(data_dir, project_name)
         logger.success(f"Published to HuggingFace at {repo_url}")
 
-    asyncio.run(run_vibe_async())
+    run_async(run_vibe_async())
 
 
 if __name__ == "__main__":
@@ -1,91 +1,157 @@
-import json
-from collections import deque
+import atexit
+import sqlite3
+import time
 from pathlib import Path
-from typing import Optional
+from typing import Iterable, Optional
+
+import orjson
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS papers (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    reason TEXT,
+    enqueued_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_status ON papers(status, enqueued_at);
+"""
 
 
 class BFSQueue:
-    def __init__(self, path: Path = Path("bfs_queue.json")):
+    def __init__(self, path: Path = Path("bfs_queue.sqlite")):
         self.path = path
-        self.queue: deque[str] = deque()  # paper IDs in BFS order
-        self.processed: set[str] = set()
-        self.skipped: dict[str, str] = {}
-        self.in_progress: set[str] = set()
-        self.failed: dict[str, str] = {}
-        self._load_if_exists()
-
-    def _load_if_exists(self):
-        # TODO: move to sqlite
-        if self.path.exists():
-            with open(self.path) as f:
-                data = json.load(f)
-            self.queue = deque(data.get("queue", []))
-            self.processed = set(data.get("processed", []))
-            self.skipped = data.get("skipped", {})
-            self.failed = data.get("failed", {})
-
-    def _save(self):
-        data = {
-            "queue": list(self.queue),
-            "processed": list(self.processed),
-            "skipped": self.skipped,
-            "failed": self.failed,
+        self._conn = sqlite3.connect(self.path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._dirty = False
+        self._last_flush = time.monotonic()
+        self._flush_interval = 2.0
+        self._flush_every = 32
+        self._mutations_since_flush = 0
+        self._import_legacy_json()
+        # papers left in progress by an interrupted run go back to the queue
+        self._conn.execute(
+            "UPDATE papers SET status = 'queued' WHERE status = 'in_progress'"
+        )
+        self._conn.commit()
+        # fast in-memory reject for ids we've already seen in any state
+        self._known: set[str] = {
+            row[0] for row in self._conn.execute("SELECT id FROM papers")
         }
-        with open(self.path, "w") as f:
-            json.dump(data, f, indent=2)
+        atexit.register(self.flush)
+
+    def _import_legacy_json(self):
+        legacy_path = self.path.with_suffix(".json")
+        if not legacy_path.exists():
+            return
+        if self._conn.execute("SELECT 1 FROM papers LIMIT 1").fetchone():
+            return
+        data = orjson.loads(legacy_path.read_bytes())
+        now = time.time()
+        rows = [(pid, "queued", None, now) for pid in data.get("queue", [])]
+        rows += [(pid, "processed", None, now) for pid in data.get("processed", [])]
+        rows += [(pid, "skipped", r, now) for pid, r in data.get("skipped", {}).items()]
+        rows += [(pid, "failed", r, now) for pid, r in data.get("failed", {}).items()]
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO papers (id, status, reason, enqueued_at) "
+            "VALUES (?, ?, ?, ?)",
+            rows,
+        )
+
+    def _mark_dirty(self):
+        # Committing costs a WAL write, so only do it every K mutations or T seconds
+        self._dirty = True
+        self._mutations_since_flush += 1
+        if (
+            self._mutations_since_flush >= self._flush_every
+            or time.monotonic() - self._last_flush >= self._flush_interval
+        ):
+            self.flush()
+
+    def flush(self):
+        if self._dirty:
+            self._conn.commit()
+        self._dirty = False
+        self._mutations_since_flush = 0
+        self._last_flush = time.monotonic()
+
+    def _set_status(self, paper_id: str, status: str, reason: Optional[str] = None):
+        self._conn.execute(
+            "INSERT INTO papers (id, status, reason, enqueued_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET status = excluded.status, "
+            "reason = excluded.reason",
+            (paper_id, status, reason, time.time()),
+        )
+        self._known.add(paper_id)
+        self._mark_dirty()
+
+    def _ids_with_status(self, status: str, limit: int = -1) -> list[str]:
+        rows = self._conn.execute(
+            "SELECT id FROM papers WHERE status = ? ORDER BY enqueued_at, rowid LIMIT ?",
+            (status, limit),
+        )
+        return [row[0] for row in rows]
+
+    def __len__(self) -> int:
+        (count,) = self._conn.execute(
+            "SELECT COUNT(*) FROM papers WHERE status = 'queued'"
+        ).fetchone()
+        return count
 
     def add(self, paper_id: str) -> bool:
-        if not paper_id:
+        if not paper_id or paper_id in self._known:
             return False
-        if paper_id in self.processed or paper_id in self.skipped:
-            return False
-        if paper_id in self.queue:
+        cur = self._conn.execute(
+            "INSERT OR IGNORE INTO papers (id, status, enqueued_at) "
+            "VALUES (?, 'queued', ?)",
+            (paper_id, time.time()),
+        )
+        if cur.rowcount == 0:
             return False
-
-        self.queue.append(paper_id)
-        self._save()
+        self._known.add(paper_id)
+        self._mark_dirty()
         return True
 
-    def add_many(self, paper_ids: list[str]) -> int:
-        existing = (
-            set(self.queue)
-            | self.processed
-            | set(self.skipped.keys())
-            | set(self.failed.keys())
-        )
-        added = 0
+    def add_many(self, paper_ids: Iterable[str]) -> int:
+        new_ids = []
         for pid in paper_ids:
-            if pid and pid not in existing:
-                self.queue.append(pid)
-                existing.add(pid)
-                added += 1
-        if added > 0:
-            self._save()
-        return added
+            if pid and pid not in self._known:
+                self._known.add(pid)
+                new_ids.append(pid)
+        if not new_ids:
+            return 0
+        now = time.time()
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO papers (id, status, enqueued_at) "
+            "VALUES (?, 'queued', ?)",
+            [(pid, now) for pid in new_ids],
+        )
+        self._mark_dirty()
+        return len(new_ids)
 
     def pop(self) -> Optional[str]:
-        while self.queue:
-            pid = self.queue.popleft()
-            if pid not in self.processed and pid not in self.skipped:
-                self.in_progress.add(pid)
-                self._save()
-                return pid
-        return None
+        row = self._conn.execute(
+            "SELECT id FROM papers WHERE status = 'queued' "
+            "ORDER BY enqueued_at, rowid LIMIT 1"
+        ).fetchone()
+        if row is None:
+            return None
+        self._conn.execute(
+            "UPDATE papers SET status = 'in_progress' WHERE id = ?", (row[0],)
+        )
+        self._mark_dirty()
+        return row[0]
 
     def mark_processed(self, paper_id: str):
-        self.processed.add(paper_id)
-        self.in_progress.discard(paper_id)
-        self._save()
+        self._set_status(paper_id, "processed")
 
     def mark_skipped(self, paper_id: str, reason: str):
-        self.skipped[paper_id] = reason
-        self.in_progress.discard(paper_id)
-        self._save()
+        self._set_status(paper_id, "skipped", reason)
 
     def mark_failed(self, paper_id: str, reason: str):
-        self.failed[paper_id] = reason
-        self.in_progress.discard(paper_id)
-        self._save()
+        self._set_status(paper_id, "failed", reason)
 
     def __repr__(self) -> str:
-        return f"In Progress: {list(self.in_progress)}\nNext 10 in Queue: {list(self.queue)[:10]}\nProcessed: {list(self.processed)}\nSkipped: {list(self.skipped)}"
+        # previews only; a long crawl would otherwise dump every id into the log
+        return f"In Progress: {self._ids_with_status('in_progress', 10)}\nNext 10 in Queue: {self._ids_with_status('queued', 10)}\nProcessed (first 10): {self._ids_with_status('processed', 10)}\nSkipped (first 10): {self._ids_with_status('skipped', 10)}"
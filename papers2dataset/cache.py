@@ -0,0 +1,46 @@
+import functools
+import sqlite3
+import time
+from pathlib import Path
+from typing import Optional
+
+
+class SQLiteCache:
+    """Persistent key/value store kept in a single SQLite file."""
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA temp_store=MEMORY")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache "
+            "(key TEXT PRIMARY KEY, value TEXT, stored_at REAL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str, max_age: Optional[float] = None) -> Optional[str]:
+        row = self._conn.execute(
+            "SELECT value, stored_at FROM cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, stored_at = row
+        if max_age is not None and (stored_at or 0) < time.time() - max_age:
+            return None
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO cache (key, value, stored_at) VALUES (?, ?, ?)",
+            (key, value, time.time()),
+        )
+        self._conn.commit()
+
+
+@functools.lru_cache(maxsize=None)
+def open_cache(path: Path) -> SQLiteCache:
+    """Return the shared cache for `path`, opening it on first use."""
+    return SQLiteCache(path)
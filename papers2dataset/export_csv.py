@@ -3,14 +3,18 @@ from __future__ import annotations
 import csv
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Any, Iterable
+from typing import Any, Iterable, Iterator, Optional
 
 from dotenv import load_dotenv
-from huggingface_hub import HfApi
+import orjson
+from huggingface_hub import CommitOperationAdd, HfApi
+from loguru import logger
 
 load_dotenv()
 OUTPUT_CSV_NAME = "combined.csv"
+OUTPUT_PARQUET_NAME = "combined.parquet"
 
 
 def _norm_val(val: Any) -> Any:
@@ -44,24 +48,30 @@ def _pick_primary_container(data: Any) -> tuple[list[dict[str, Any]], dict[str,
     return [], {}
 
 
-def export_csv(data_dir: Path) -> None:
-    headers: list[str] = ["source"]
-    rows: list[dict[str, Any]] = []
+def _load_json_files(paths: list[Path]) -> Iterator[tuple[Path, Any]]:
+    """Read and parse files on a thread pool, yielding them in order.
+
+    Files are handled a chunk at a time so parsed data doesn't pile up
+    ahead of the consumer.
+    """
+    max_workers = min(32, (os.cpu_count() or 1) * 4)
+    chunk_size = max_workers * 4
+    with ThreadPoolExecutor(max_workers=max_workers) as ex:
+        for i in range(0, len(paths), chunk_size):
+            chunk = paths[i : i + chunk_size]
+            yield from zip(chunk, ex.map(lambda p: orjson.loads(p.read_bytes()), chunk))
 
-    def add_headers_from_row(row: dict[str, Any]) -> None:
-        for key in row.keys():
-            if key not in headers:
-                headers.append(key)
 
-    for path in sorted(data_dir.glob("*.json")):
-        data = json.loads(path.read_text())
+def _iter_rows(data_dir: Path) -> Iterator[dict[str, Any]]:
+    paths = sorted(data_dir.glob("*.json"))
+    for path, data in _load_json_files(paths):
         primary_records, outer_ctx = _pick_primary_container(data)
 
         if not primary_records:
             primary_records = [data] if isinstance(data, dict) else []
             outer_ctx = {}
 
-        outer_flat = {f"file_{k}": _norm_val(v) for k, v in outer_ctx.items()}
+        outer_flat = {f"file_{k}": v for k, v in outer_ctx.items()}
 
         for record in primary_records:
             if not isinstance(record, dict):
@@ -69,15 +79,68 @@ def export_csv(data_dir: Path) -> None:
 
             row: dict[str, Any] = {"source": path.stem}
             row.update(outer_flat)
-            row.update({f"record_{k}": _norm_val(v) for k, v in record.items()})
+            row.update({f"record_{k}": v for k, v in record.items()})
+            yield row
+
+
+def _collect_rows(data_dir: Path) -> tuple[list[str], list[dict[str, Any]]]:
+    """Parse every file once, returning the header union and the raw rows.
+
+    Nested values are left as-is; each exporter decides how to store them.
+    """
+    headers: dict[str, None] = {"source": None}
+    rows = []
+    for row in _iter_rows(data_dir):
+        headers.update(dict.fromkeys(row))
+        rows.append(row)
+    return list(headers), rows
 
-            add_headers_from_row(row)
-            rows.append(row)
 
+def export_csv(
+    data_dir: Path, collected: Optional[tuple[list[str], list[dict[str, Any]]]] = None
+) -> None:
+    fieldnames, rows = collected or _collect_rows(data_dir)
     with (data_dir / OUTPUT_CSV_NAME).open("w", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=headers)
-        writer.writeheader()
-        writer.writerows(rows)
+        writer = csv.writer(f)
+        writer.writerow(fieldnames)
+        for row in rows:
+            writer.writerow([_norm_val(row.get(h, "")) for h in fieldnames])
+
+
+def export_parquet(
+    data_dir: Path, collected: Optional[tuple[list[str], list[dict[str, Any]]]] = None
+) -> Optional[Path]:
+    """Write the rows as zstd Parquet, keeping nested values as Arrow types.
+
+    Needs the optional pyarrow dependency; returns None when it is missing
+    or the rows can't be stored even with nested values as JSON strings.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        return None
+
+    # columns are built over the header union: from_pylist would take the
+    # schema from the first row alone and drop fields only later papers have
+    fieldnames, rows = collected or _collect_rows(data_dir)
+    out_path = data_dir / OUTPUT_PARQUET_NAME
+    error = None
+    for norm in (lambda v: v, _norm_val):
+        try:
+            table = pa.Table.from_pydict(
+                {h: [norm(row.get(h)) for row in rows] for h in fieldnames}
+            )
+            pq.write_table(table, out_path, compression="zstd", use_dictionary=True)
+            return out_path
+        except pa.ArrowException as e:
+            # the same field came back with different shapes across papers, or
+            # as something Parquet can't store (e.g. an empty object); retry
+            # with nested values as JSON strings
+            error = e
+    out_path.unlink(missing_ok=True)
+    logger.warning(f"Skipping Parquet export: {error}")
+    return None
 
 
 def publish_to_hf(
@@ -88,7 +151,10 @@ def publish_to_hf(
     private: bool = True,
     tags: Iterable[str] | None = None,
 ) -> None:
-    export_csv(data_dir)
+    # parse the data files once and hand the rows to both exporters
+    collected = _collect_rows(data_dir)
+    export_csv(data_dir, collected)
+    parquet_path = export_parquet(data_dir, collected)
 
     hf_token = token or os.getenv("HF_TOKEN")
     if not hf_token:
@@ -131,17 +197,26 @@ private: {str(private).lower()}
 Auto-generated CSV using papers2dataset tool.
 """
 
-    api.upload_file(
-        path_or_fileobj=(data_dir / OUTPUT_CSV_NAME),
-        path_in_repo=OUTPUT_CSV_NAME,
-        repo_id=full_repo_id,
-        repo_type="dataset",
-    )
-
-    api.upload_file(
-        path_or_fileobj=card.encode("utf-8"),
-        path_in_repo="README.md",
+    operations = [
+        CommitOperationAdd(
+            path_in_repo=OUTPUT_CSV_NAME,
+            path_or_fileobj=data_dir / OUTPUT_CSV_NAME,
+        ),
+        CommitOperationAdd(
+            path_in_repo="README.md", path_or_fileobj=card.encode("utf-8")
+        ),
+    ]
+    if parquet_path is not None:
+        operations.append(
+            CommitOperationAdd(
+                path_in_repo=OUTPUT_PARQUET_NAME, path_or_fileobj=parquet_path
+            )
+        )
+    # one commit for all files, so the repo never shows a CSV with a stale card
+    api.create_commit(
         repo_id=full_repo_id,
         repo_type="dataset",
+        operations=operations,
+        commit_message="Update dataset",
     )
     return repo_url
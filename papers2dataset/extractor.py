@@ -1,53 +1,74 @@
 import asyncio
+import contextlib
+import itertools
 from papers2dataset.openalex_client import (
-    fetch_work,
     fetch_pdf,
-    fetch_cited_works,
     fetch_citing_works,
-    fetch_related_works,
+    has_pdf_candidate,
 )
 from papers2dataset.models import extract_cpa_from_pdf, check_paper_relevance
 from papers2dataset.bfs_queue import BFSQueue
 from loguru import logger
 
 
-async def process_one_paper(pid, q: BFSQueue, project_dir, semaphore):
+async def process_one_paper(pid, paper, q: BFSQueue, project_dir, semaphore):
     async with semaphore:
-        paper = await asyncio.to_thread(fetch_work, pid)
-        if not paper:
-            logger.warning(f"Failed to fetch metadata for {pid}")
-            q.mark_failed(pid, "metadata_fetch_failed")
-            return
+        try:
+            if not paper:
+                logger.warning(f"Failed to fetch metadata for {pid}")
+                q.mark_failed(pid, "metadata_fetch_failed")
+                return
 
-        pdf_path = await fetch_pdf(paper, project_dir)
-        if pdf_path is None:
-            logger.warning(f"Failed to download PDF for {paper['id']}")
-            q.mark_failed(pid, "no_pdf")
-            return
+            # the relevance check only needs metadata, so overlap it with the
+            # download when a PDF is likely; otherwise papers that can't be
+            # extracted anyway would spend a rate-limited model call
+            relevance = None
+            if has_pdf_candidate(paper):
+                relevance = asyncio.ensure_future(
+                    check_paper_relevance(paper, project_dir)
+                )
+            pdf_path = None
+            try:
+                pdf_path = await fetch_pdf(paper, project_dir)
+            finally:
+                if pdf_path is None and relevance is not None:
+                    relevance.cancel()
+                    with contextlib.suppress(asyncio.CancelledError, Exception):
+                        await relevance
+            if pdf_path is None:
+                logger.warning(f"Failed to download PDF for {paper['id']}")
+                q.mark_failed(pid, "no_pdf")
+                return
 
-        res = await check_paper_relevance(paper, project_dir)
-        if not res["is_relevant"]:
-            reason_skipped = f"Paper {paper.get('id')} is not relevant because {res.get('reason')}, model used: {res.get('model_used')}"
-            logger.warning(reason_skipped)
-            q.mark_skipped(pid, reason_skipped)
-            return
+            if relevance is None:
+                relevance = check_paper_relevance(paper, project_dir)
+            res = await relevance
 
-        resp = await extract_cpa_from_pdf(pdf_path, project_dir)
-        if resp.get("error"):
-            error_text = f"Failed to extract CPA from PDF for {paper['id']}, error: {resp['error']}, model used: {resp.get('model_used')}"
-            logger.warning(error_text)
-            q.mark_failed(pid, error_text)
-            return
+            if not res["is_relevant"]:
+                reason_skipped = f"Paper {paper.get('id')} is not relevant because {res.get('reason')}, model used: {res.get('model_used')}"
+                logger.warning(reason_skipped)
+                q.mark_skipped(pid, reason_skipped)
+                return
 
-        related_task = asyncio.to_thread(fetch_related_works, pid)
-        cited_task = asyncio.to_thread(fetch_cited_works, pid)
-        citing_task = asyncio.to_thread(fetch_citing_works, pid)
+            resp = await extract_cpa_from_pdf(pdf_path, project_dir)
+            if resp.get("error"):
+                error_text = f"Failed to extract CPA from PDF for {paper['id']}, error: {resp['error']}, model used: {resp.get('model_used')}"
+                logger.warning(error_text)
+                q.mark_failed(pid, error_text)
+                return
 
-        related, cited, citing = await asyncio.gather(
-            related_task, cited_task, citing_task
-        )
-
-        new_ids = [x.get("id", "").split("/")[-1] for x in related + cited + citing]
-        q.add_many(new_ids)
-        q.mark_processed(pid)
-        logger.success(f"Processed {paper['id']}")
+            # referenced and related works are already id lists on the record,
+            # only citing works need a query
+            citing = await fetch_citing_works(pid)
+            q.add_many(
+                url.rpartition("/")[2]
+                for url in itertools.chain(
+                    paper.get("related_works", [])[:50],
+                    paper.get("referenced_works", [])[:200],
+                    (x.get("id", "") for x in citing),
+                )
+            )
+            q.mark_processed(pid)
+            logger.success(f"Processed {paper['id']}")
+        finally:
+            q.flush()
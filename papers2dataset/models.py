@@ -1,14 +1,18 @@
+import asyncio
 import base64
-import json
+import functools
+import hashlib
+import mmap
+import os
 from pathlib import Path
-from typing import Any
+from typing import Any, Optional
 
 from dotenv import load_dotenv
-from litellm import Router
 from loguru import logger
-import pymupdf
+import orjson
 
-from papers2dataset.project import load_assets
+from papers2dataset.cache import open_cache
+from papers2dataset.project import canonical_schema, load_assets, load_keywords
 
 load_dotenv()
 # litellm.suppress_debug_info = True
@@ -42,124 +46,267 @@ model_list = [
 for model in FALLBACK_MODELS:
     model_list.append({"model_name": model, "litellm_params": {"model": model}})
 
-# TODO: figure out what's wrong with fallbacks here
-router = Router(
-    model_list=model_list,
-    fallbacks=[
-        {"data_extractor": FALLBACK_MODELS},
-        {"relevance_checker": FALLBACK_MODELS},
-        {"project_generator": FALLBACK_MODELS},
-    ],
-    num_retries=1,
-    cooldown_time=30,
+
+@functools.lru_cache(maxsize=1)
+def _get_router():
+    # built on first use: importing litellm and setting up its clients is slow,
+    # and commands like search/export never call a model
+    from litellm import Router
+
+    # TODO: figure out what's wrong with fallbacks here
+    return Router(
+        model_list=model_list,
+        fallbacks=[
+            {"data_extractor": FALLBACK_MODELS},
+            {"relevance_checker": FALLBACK_MODELS},
+            {"project_generator": FALLBACK_MODELS},
+        ],
+        # fail over to the next model straight away instead of retrying a 429'd one
+        num_retries=0,
+        allowed_fails=0,
+        retry_after=1,
+        cooldown_time=30,
+    )
+
+
+# cap in-flight LLM calls so a wide BFS frontier doesn't trigger 429 cooldowns
+_extract_semaphore = asyncio.Semaphore(int(os.getenv("P2D_EXTRACT_CONCURRENCY", "8")))
+_relevance_semaphore = asyncio.Semaphore(
+    int(os.getenv("P2D_RELEVANCE_CONCURRENCY", "16"))
 )
+_inflight_extractions: dict[str, asyncio.Future] = {}
+
+
+def _cache_key(*parts: str) -> str:
+    # length-prefix each part so no two different part lists hash the same input
+    h = hashlib.sha256()
+    for part in parts:
+        data = part.encode()
+        h.update(len(data).to_bytes(8, "little"))
+        h.update(data)
+    return h.hexdigest()
+
+
+@functools.lru_cache(maxsize=8)
+def _prompt_part(prompt: str) -> dict[str, str]:
+    # one shared text part per prompt, so every PDF's request reuses it
+    return {"type": "text", "text": prompt}
+
+
+def _pdf_data_url(pdf_path: Path) -> str:
+    # encode from an mmap straight into the data URL buffer, so neither the raw
+    # PDF nor an intermediate base64 str is ever held as a separate copy;
+    # chunk size is a multiple of 3 so chunks concatenate without padding
+    chunk_size = 57 * 1024
+    buf = bytearray(b"data:application/pdf;base64,")
+    with (
+        open(pdf_path, "rb") as f,
+        mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm,
+    ):
+        view = memoryview(mm)
+        try:
+            for i in range(0, len(view), chunk_size):
+                buf += base64.b64encode(view[i : i + chunk_size])
+        finally:
+            view.release()
+    return buf.decode("ascii")
+
+
+def _sniff_pdf(pdf_path: Path) -> Optional[str]:
+    """Return the file's sha256 if it looks like a PDF, otherwise None."""
+    with open(pdf_path, "rb") as f:
+        # the spec lets readers accept junk before the header within the first 1 KiB
+        if b"%PDF-" not in f.read(1024):
+            return None
+        f.seek(0)
+        return hashlib.file_digest(f, "sha256").hexdigest()
 
 
 async def extract_cpa_from_pdf(
     pdf_path: Path,
     project_dir: Path,
 ) -> dict[str, Any]:
-    schema, prompt, _, _ = load_assets(project_dir)
+    # data/<stem>.json is only output; reuse goes through the cache key below so
+    # editing the schema or prompt, or switching models, re-extracts
     data_dir = project_dir / "data"
-    data_dir.mkdir(exist_ok=True)
     res_file = data_dir / f"{pdf_path.stem}.json"
-    if res_file.exists():
-        with open(res_file, "r") as f:
-            result = json.load(f)
-            result["model_used"] = result.get("model_used", "cached")
+    schema, prompt, _, _ = load_assets(project_dir)
+    data_dir.mkdir(exist_ok=True)
+
+    pdf_sha256 = await asyncio.to_thread(_sniff_pdf, pdf_path)
+    if pdf_sha256 is None:
+        return {"error": "invalid_pdf: missing %PDF- header", "model_used": "none"}
+
+    cache = open_cache(project_dir / "cache" / "extraction.sqlite")
+    cache_key = _cache_key(
+        DATA_EXTRACTOR_MODEL_NAME,
+        pdf_sha256,
+        prompt,
+        canonical_schema(project_dir),
+    )
+    cached = cache.get(cache_key)
+    if cached is not None:
+        result = orjson.loads(cached)
+    else:
+
+        async def extract_and_cache() -> dict[str, Any]:
+            result = await _run_extraction(pdf_path, prompt, schema)
+            cache.set(cache_key, orjson.dumps(result).decode())
             return result
 
+        result = await _single_flight(cache_key, extract_and_cache)
+
+    await asyncio.to_thread(
+        res_file.write_bytes, orjson.dumps(result, option=orjson.OPT_INDENT_2)
+    )
+    return result
+
+
+async def _single_flight(key: str, run) -> dict[str, Any]:
+    # identical PDFs reached under different ids share one in-flight LLM call
+    while (pending := _inflight_extractions.get(key)) is not None:
+        result = await asyncio.shield(pending)
+        if result is not None:
+            return dict(result)
+    fut = asyncio.get_running_loop().create_future()
+    _inflight_extractions[key] = fut
+    result = None
     try:
-        doc = pymupdf.open(pdf_path)
-        if len(doc) == 0:
-            return {"error": "pdf no pages", "model_used": "none"}
-        doc.close()
-    except Exception as e:
-        return {"error": f"invalid_pdf: {str(e)}", "model_used": "none"}
-
-    pdf_bytes = pdf_path.read_bytes()
-    encoded_pdf = base64.b64encode(pdf_bytes).decode("utf-8")
-
-    messages = [
-        {
-            "role": "user",
-            "content": [
-                {"type": "text", "text": prompt},
-                {
-                    "type": "file",
-                    "file": {
-                        "file_data": f"data:application/pdf;base64,{encoded_pdf}",
-                    },
-                },
-            ],
-        }
-    ]
+        result = await run()
+        return result
+    finally:
+        if _inflight_extractions.get(key) is fut:
+            del _inflight_extractions[key]
+        # on failure waiters wake with None and one of them takes over
+        fut.set_result(result)
+
 
+async def _run_extraction(
+    pdf_path: Path,
+    prompt: str,
+    schema: dict[str, Any],
+) -> dict[str, Any]:
     logger.debug(f"Extracting data from {pdf_path.name}")
-    response = await router.acompletion(
-        model="data_extractor",
-        messages=messages,
-        response_format={
-            "type": "json_object",
-            "response_schema": schema,
-        },
-    )
+    async with _extract_semaphore:
+        # always the local bytes: the cache key is their sha256, and a publisher
+        # url can serve a landing page or a different version of the paper
+        # (encoded inside the semaphore so at most N base64 copies are alive)
+        file_data = await asyncio.to_thread(_pdf_data_url, pdf_path)
+        response = await _get_router().acompletion(
+            model="data_extractor",
+            messages=[
+                {
+                    "role": "user",
+                    "content": [
+                        _prompt_part(prompt),
+                        {"type": "file", "file": {"file_data": file_data}},
+                    ],
+                }
+            ],
+            response_format={
+                "type": "json_object",
+                "response_schema": schema,
+            },
+        )
 
     content = response.choices[0].message.content
-    result = json.loads(content)
+    result = orjson.loads(content)
     result["model_used"] = response.model
-
-    with open(data_dir / f"{pdf_path.stem}.json", "w") as f:
-        json.dump(result, f, indent=2)
     return result
 
 
+def _local_relevance(
+    title: str, abstract: str, keywords: list[str], negative_keywords: list[str]
+) -> Optional[str]:
+    """Return a rejection reason if keywords alone rule the paper out."""
+    text = f"{title} {abstract}".lower()
+    for kw in negative_keywords:
+        if kw.lower() in text:
+            return f"local_filter: matched negative keyword {kw!r}"
+    # without an abstract the title alone is too little to reject on
+    if keywords and abstract and not any(kw.lower() in text for kw in keywords):
+        return "local_filter: no project keywords in title or abstract"
+    return None
+
+
 async def check_paper_relevance(
     paper: dict[str, Any],
     project_dir: Path,
 ) -> dict[str, Any]:
     _, _, relevance_prompt, _ = load_assets(project_dir)
-    title = paper.get("title", "")
+    title = paper.get("title", "") or ""
     abstract = ""
     if paper.get("abstract_inverted_index"):
         index = paper["abstract_inverted_index"]
-        word_list = []
+        max_pos = max(
+            (p for positions in index.values() for p in positions), default=-1
+        )
+        words = [""] * (max_pos + 1)
         for word, positions in index.items():
             for pos in positions:
-                word_list.append((pos, word))
-        word_list.sort()
-        abstract = " ".join([w[1] for w in word_list])
-    prompt = relevance_prompt.format(title=title, abstract=abstract)
-    logger.debug(f"Checking relevance of {title}")
-    response = await router.acompletion(
-        model="relevance_checker",
-        messages=[{"role": "user", "content": prompt}],
-        response_format={
-            "type": "json_object",
-            "response_schema": {
-                "type": "object",
-                "properties": {
-                    "is_relevant": {"type": "boolean"},
-                    "reason": {"type": "string"},
+                words[pos] = word
+        abstract = " ".join(filter(None, words))
+
+    metadata_len = len(title.strip()) + len(abstract.strip())
+    if metadata_len < 20:
+        # OpenAlex stubs without metadata; the model could only guess
+        return {
+            "is_relevant": False,
+            "reason": "insufficient_metadata"
+            if metadata_len
+            else "empty_title_and_abstract",
+            "model_used": "none",
+        }
+
+    keywords, negative_keywords = load_keywords(project_dir)
+    reason = _local_relevance(title, abstract, keywords, negative_keywords)
+    if reason:
+        return {"is_relevant": False, "reason": reason, "model_used": "local"}
+
+    # the template's instructions stay identical across papers so providers can
+    # cache them as a prefix; the paper itself goes in a second message
+    instructions = relevance_prompt.format(
+        title="(given in the next message)", abstract="(given in the next message)"
+    )
+    paper_text = f"TITLE: {title}\nABSTRACT: {abstract}"
+    cache = open_cache(project_dir / "cache" / "relevance.sqlite")
+    cache_key = _cache_key(RELEVANCE_MODEL_NAME, instructions, paper_text)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return orjson.loads(cached)
+
+    logger.debug("Checking relevance of {}", title)
+    async with _relevance_semaphore:
+        response = await _get_router().acompletion(
+            model="relevance_checker",
+            messages=[
+                {"role": "system", "content": instructions},
+                {"role": "user", "content": paper_text},
+            ],
+            response_format={
+                "type": "json_object",
+                "response_schema": {
+                    "type": "object",
+                    "properties": {
+                        "is_relevant": {"type": "boolean"},
+                        "reason": {"type": "string"},
+                    },
+                    "required": ["is_relevant"],
                 },
-                "required": ["is_relevant"],
             },
-        },
-    )
+        )
 
     content = response.choices[0].message.content
-    result = json.loads(content)
+    result = orjson.loads(content)
     result["model_used"] = response.model
+    cache.set(cache_key, orjson.dumps(result).decode())
     return result
 
 
-async def generate_project_assets(
-    project_description: str,
-) -> dict[str, Any]:
-    prompt = f"""
+PROJECT_GENERATOR_PROMPT = """
 You are helping to create a dataset from academic papers. Based on the project description, generate all necessary assets for automated data extraction.
 
-PROJECT DESCRIPTION: {project_description}
+The PROJECT DESCRIPTION is given in the next message.
 
 Your task is to create:
 
@@ -204,22 +351,40 @@ Your task is to create:
    - Is filesystem-safe
    - Is memorable and descriptive
 
+6. KEYWORDS: Lists used to cheaply pre-filter papers by title and abstract before the relevance prompt:
+   - "keywords": 10-30 lowercase words or short phrases; a relevant abstract should contain at least one
+   - Include synonyms, abbreviations and spelling variants so relevant papers are not dropped
+   - "negative_keywords": a few lowercase phrases that only appear in clearly off-topic papers, or an empty list
+
 Return a JSON object with exactly these keys:
-{{
+{
     "schema": <JSON schema as a string>,
     "prompt": <detailed extraction prompt string>,
     "search_query": <optimal search query string>,
     "relevance_prompt": <paper relevance filtering prompt string>,
-    "project_name": <short safe project name string>
-}}
+    "project_name": <short safe project name string>,
+    "keywords": <list of keyword strings>,
+    "negative_keywords": <list of keyword strings>
+}
 
 Make sure each generated asset is comprehensive, well-structured, and immediately usable for automated dataset creation.
 """
 
+
+async def generate_project_assets(
+    project_description: str,
+) -> dict[str, Any]:
     logger.debug("Generating project assets using router")
-    response = await router.acompletion(
+    response = await _get_router().acompletion(
         model="project_generator",
-        messages=[{"role": "user", "content": prompt}],
+        messages=[
+            # static instructions first so providers can reuse the cached prefix
+            {"role": "system", "content": PROJECT_GENERATOR_PROMPT},
+            {
+                "role": "user",
+                "content": f"PROJECT DESCRIPTION: {project_description}",
+            },
+        ],
         response_format={
             "type": "json_object",
             "response_schema": {
@@ -230,6 +395,11 @@ Make sure each generated asset is comprehensive, well-structured, and immediatel
                     "search_query": {"type": "string"},
                     "relevance_prompt": {"type": "string"},
                     "project_name": {"type": "string"},
+                    "keywords": {"type": "array", "items": {"type": "string"}},
+                    "negative_keywords": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                    },
                 },
                 "required": [
                     "schema",
@@ -243,13 +413,13 @@ Make sure each generated asset is comprehensive, well-structured, and immediatel
     )
 
     content = response.choices[0].message.content
-    result = json.loads(content)
+    result = orjson.loads(content)
     result["model_used"] = response.model
 
     if isinstance(result.get("schema"), str):
         try:
-            result["schema"] = json.loads(result["schema"])
-        except json.JSONDecodeError:
+            result["schema"] = orjson.loads(result["schema"])
+        except orjson.JSONDecodeError:
             logger.warning("Failed to parse schema string, keeping as string")
 
     return result
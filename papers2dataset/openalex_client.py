@@ -1,67 +1,221 @@
+import asyncio
 import os
+import random
 import re
 import time
+from collections import defaultdict
 from pathlib import Path
 from typing import Optional
 import httpx
+import orjson
 from loguru import logger
 from curl_cffi.requests import AsyncSession
+from curl_cffi.requests import exceptions as curl_errors
+from dotenv import load_dotenv
+
+from papers2dataset.cache import SQLiteCache, open_cache
+
+load_dotenv()
 
 BASE_URL = "https://api.openalex.org"
+# read once; the env doesn't change during a run
+_EMAIL = os.environ.get("OPENALEX_EMAIL", "")
 # TODO: move to config
-_last_request_time = 0
-_min_request_interval = 0.1
+_max_requests_per_host = 10
+# publishers throttle harder than the APIs, and every paper races several urls
+_max_pdf_downloads = 8
+_max_pdf_downloads_per_host = 4
+# hosts that refused or timed out are skipped for a while
+_dead_host_ttl = 600
+_dead_hosts: dict[str, float] = {}
+# a pdf url answering with these is a real miss rather than a hiccup
+_PDF_GONE_STATUSES = frozenset({404, 410})
+# resolver result for "the API answered, it just has no pdf"; None means the lookup failed
+_NO_PDF = ""
+# OpenAlex accepts up to 100 OR'ed values in one filter
+_ID_FILTER_BATCH = 100
+# OpenAlex metadata barely changes, a week-old copy is good enough for BFS
+_works_cache_ttl = 7 * 24 * 3600
+_works_cache: Optional[SQLiteCache] = None
+_inflight_works: dict[str, asyncio.Future] = {}
+# citing works only feed ids into the BFS queue; full records are fetched
+# when a paper is actually processed
+_NEIGHBOUR_FIELDS = "id,doi,title"
+# search hits are only handed to fetch_pdf
+_SEARCH_FIELDS = "id,doi,title,primary_location,best_oa_location,locations"
+# matched against the raw PMC OA response, https links preferred over ftp
+_PMC_HTTPS_PDF_RE = re.compile(rb'href="(https://[^"]+\.pdf)"')
+_PMC_FTP_PDF_RE = re.compile(rb'href="(ftp://[^"]+\.pdf)"')
+_PMC_ARTICLE_RE = re.compile(r"/pmc/articles/(PMC\d+)")
+
+_client: Optional[httpx.AsyncClient] = None
+_pdf_session: Optional[AsyncSession] = None
+_ncbi_session_warm = False
+_host_semaphores: dict[str, asyncio.Semaphore] = defaultdict(
+    lambda: asyncio.Semaphore(_max_requests_per_host)
+)
+_pdf_semaphore: Optional[asyncio.Semaphore] = None
+_pdf_host_semaphores: dict[str, asyncio.Semaphore] = defaultdict(
+    lambda: asyncio.Semaphore(_max_pdf_downloads_per_host)
+)
+
+
+def _get_client() -> httpx.AsyncClient:
+    # created lazily so the connection pool belongs to the running event loop
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+            timeout=30.0,
+            follow_redirects=True,
+        )
+    return _client
+
+
+def _get_pdf_session() -> AsyncSession:
+    # one browser-impersonating session so publisher connections and cookies
+    # are reused across downloads
+    global _pdf_session
+    if _pdf_session is None:
+        _pdf_session = AsyncSession()
+    return _pdf_session
+
+
+def _get_pdf_semaphore() -> asyncio.Semaphore:
+    global _pdf_semaphore
+    if _pdf_semaphore is None:
+        _pdf_semaphore = asyncio.Semaphore(_max_pdf_downloads)
+    return _pdf_semaphore
+
+
+async def close_client():
+    global _client, _pdf_session, _pdf_semaphore, _ncbi_session_warm
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+    if _pdf_session is not None:
+        await _pdf_session.close()
+        _pdf_session = None
+    _ncbi_session_warm = False
+    _host_semaphores.clear()
+    _pdf_semaphore = None
+    _pdf_host_semaphores.clear()
+
+
+def use_works_cache(project_dir: Path):
+    """Keep fetched work metadata and neighbour lists in the project's cache."""
+    global _works_cache
+    _works_cache = open_cache(project_dir / "cache" / "works.sqlite")
+
+
+def _cache_get(key: str):
+    if _works_cache is None:
+        return None
+    cached = _works_cache.get(key, max_age=_works_cache_ttl)
+    return orjson.loads(cached) if cached is not None else None
+
+
+def _cache_set(key: str, value) -> None:
+    if _works_cache is not None:
+        _works_cache.set(key, orjson.dumps(value).decode())
+
+
+class TokenBucket:
+    """Allow bursts of up to `capacity` requests while keeping `rate` per second on average."""
+
+    __slots__ = ("rate", "capacity", "tokens", "ts")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.ts = time.monotonic()
+
+    async def acquire(self):
+        # Refill and take a token without awaiting in between, so on a single
+        # event loop this is atomic. Going negative reserves a future token and
+        # later callers queue up behind it.
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.ts) * self.rate)
+        self.ts = now
+        self.tokens -= 1
+        if self.tokens < 0:
+            await asyncio.sleep(-self.tokens / self.rate)
+
 
+if _EMAIL:
+    # OpenAlex polite pool: 10 req/s
+    _rate_limiter = TokenBucket(rate=10, capacity=10)
+else:
+    logger.debug("Warning: OPENALEX_EMAIL not set. Rate limited to 1 req/sec.")
+    _rate_limiter = TokenBucket(rate=1, capacity=1)
 
-def _get_email() -> str:
-    email = os.environ.get("OPENALEX_EMAIL", "")
-    if not email:
-        logger.debug("Warning: OPENALEX_EMAIL not set. Rate limited to 1 req/sec.")
-        global _min_request_interval
-        _min_request_interval = 1.0
-    return email
+# everything that isn't OpenAlex gets its own bucket so PDF downloads and
+# resolver lookups don't spend OpenAlex's budget or each other's
+_host_rates = {
+    "api.unpaywall.org": 5,
+    "api.biorxiv.org": 5,
+    # NCBI allows 3 req/s without an API key
+    "www.ncbi.nlm.nih.gov": 3,
+}
+_default_host_rate = 5
+_host_rate_limiters: dict[str, TokenBucket] = {}
 
 
-def _rate_limit():
-    global _last_request_time
-    now = time.time()
-    elapsed = now - _last_request_time
-    if elapsed < _min_request_interval:
-        time.sleep(_min_request_interval - elapsed)
-    _last_request_time = time.time()
+def _url_host(url: str) -> str:
+    # authority part of the url; a full parse isn't needed for a dict key
+    return url.split("/", 3)[2] if "://" in url else ""
 
 
-def _make_request(
+def _host_rate_limiter(url: str) -> TokenBucket:
+    host = _url_host(url)
+    limiter = _host_rate_limiters.get(host)
+    if limiter is None:
+        rate = _host_rates.get(host, _default_host_rate)
+        limiter = _host_rate_limiters[host] = TokenBucket(rate=rate, capacity=rate)
+    return limiter
+
+
+_BACKOFF = (1, 2, 4, 8, 16)
+
+
+def _backoff(attempt: int) -> float:
+    # jitter keeps concurrent workers from all retrying on the same tick
+    base = _BACKOFF[min(attempt, len(_BACKOFF) - 1)]
+    return base + random.uniform(0, base * 0.25)
+
+
+async def _make_request(
     url: str, params: Optional[dict] = None, max_retries: int = 5
 ) -> Optional[dict]:
-    _rate_limit()
+    await _rate_limiter.acquire()
 
-    email = _get_email()
     if params is None:
         params = {}
-    if email:
-        params["mailto"] = email
+    if _EMAIL:
+        params["mailto"] = _EMAIL
 
+    host = _url_host(url)
     for attempt in range(max_retries):
         try:
-            response = httpx.get(
-                url, params=params, timeout=30.0, follow_redirects=True
-            )
+            async with _host_semaphores[host]:
+                response = await _get_client().get(url, params=params)
 
             if response.status_code == 200:
-                return response.json()
+                return orjson.loads(response.content)
             elif response.status_code == 404:
                 return None
             elif response.status_code == 429:
-                wait_time = 2**attempt
-                logger.debug(f"Rate limited, waiting {wait_time}s...")
-                time.sleep(wait_time)
+                wait_time = _backoff(attempt)
+                logger.debug(f"Rate limited, waiting {wait_time:.1f}s...")
+                await asyncio.sleep(wait_time)
             elif response.status_code >= 500:
-                wait_time = 2**attempt
+                wait_time = _backoff(attempt)
                 logger.debug(
-                    f"Server error {response.status_code}, waiting {wait_time}s..."
+                    f"Server error {response.status_code}, waiting {wait_time:.1f}s..."
                 )
-                time.sleep(wait_time)
+                await asyncio.sleep(wait_time)
             else:
                 logger.debug(
                     f"Unexpected status {response.status_code}: {response.text[:200]}"
@@ -70,9 +224,9 @@ def _make_request(
 
         except httpx.TimeoutException:
             if attempt < max_retries - 1:
-                wait_time = 2**attempt
-                logger.debug(f"Timeout, waiting {wait_time}s...")
-                time.sleep(wait_time)
+                wait_time = _backoff(attempt)
+                logger.debug(f"Timeout, waiting {wait_time:.1f}s...")
+                await asyncio.sleep(wait_time)
         except httpx.HTTPError as e:
             logger.debug(f"Request error: {e}")
             return None
@@ -81,166 +235,233 @@ def _make_request(
     return None
 
 
-def fetch_work(identifier: str) -> Optional[dict]:
-    if identifier.startswith("W"):
-        url = f"{BASE_URL}/works/{identifier}"
-    elif identifier.startswith("https://openalex.org/"):
+async def fetch_work(identifier: str) -> Optional[dict]:
+    cached = _cache_get(f"work:{identifier}")
+    if cached is not None:
+        return cached
+
+    # the cited and related lookups for a paper run concurrently and both start
+    # with its work record, so share the request instead of issuing it twice
+    pending = _inflight_works.get(identifier)
+    if pending is None:
+        pending = asyncio.ensure_future(_fetch_work_uncached(identifier))
+        _inflight_works[identifier] = pending
+        pending.add_done_callback(lambda _: _inflight_works.pop(identifier, None))
+    return await asyncio.shield(pending)
+
+
+async def _fetch_work_uncached(identifier: str) -> Optional[dict]:
+    if identifier.startswith("https://openalex.org/"):
         # Full OpenAlex URL
-        openalex_id = identifier.split("/")[-1]
-        url = f"{BASE_URL}/works/{openalex_id}"
-    elif "doi.org" in identifier:
-        # DOI URL
-        url = f"{BASE_URL}/works/{identifier}"
+        path = identifier.rpartition("/")[2]
+    elif identifier.startswith("W") or "doi.org" in identifier:
+        # OpenAlex id or DOI URL, both accepted as-is
+        path = identifier
     else:
         # Bare DOI
-        url = f"{BASE_URL}/works/https://doi.org/{identifier}"
-    return _make_request(url)
+        path = f"https://doi.org/{identifier}"
+    work = await _make_request(f"{BASE_URL}/works/{path}")
+    if work:
+        _cache_set(f"work:{identifier}", work)
+    return work
 
 
-def fetch_cited_works(openalex_id: str, max_results: int = 200) -> list[dict]:
-    work = fetch_work(openalex_id)
-    if not work:
-        return []
-
-    referenced_ids = work.get("referenced_works", [])
-    if not referenced_ids:
-        return []
-
-    referenced_ids = referenced_ids[:max_results]
+async def _fetch_works_by_ids(ids: list[str]) -> list[dict]:
+    url = f"{BASE_URL}/works"
+    short_ids = [x.rpartition("/")[2] for x in ids]
+    requests = []
+    for i in range(0, len(short_ids), _ID_FILTER_BATCH):
+        filter_value = "|".join(short_ids[i : i + _ID_FILTER_BATCH])
+        params = {"filter": f"openalex_id:{filter_value}", "per-page": _ID_FILTER_BATCH}
+        requests.append(_make_request(url, params))
+
+    # batches are independent; the host semaphore and rate limiter pace them
     results = []
-    for i in range(0, len(referenced_ids), 50):
-        batch = referenced_ids[i : i + 50]
-        batch_ids = [url.split("/")[-1] if "/" in url else url for url in batch]
-
-        filter_value = "|".join(batch_ids)
-        url = f"{BASE_URL}/works"
-        params = {"filter": f"openalex_id:{filter_value}", "per-page": 50}
-
-        data = _make_request(url, params)
+    for data in await asyncio.gather(*requests):
         if data and "results" in data:
             results.extend(data["results"])
 
     return results
 
 
-def fetch_citing_works(openalex_id: str, max_results: int = 200) -> list[dict]:
-    url = f"{BASE_URL}/works"
-    params = {
-        "filter": f"cites:{openalex_id}",
-        "per-page": min(max_results, 200),
-        "sort": "cited_by_count:desc",
-    }
-
-    data = _make_request(url, params)
-    if data and "results" in data:
-        return data["results"]
+async def fetch_works_batch(identifiers: list[str]) -> dict[str, dict]:
+    """Fetch metadata for many works at once, keyed by the identifier passed in."""
+    works = {}
+    for identifier in identifiers:
+        cached = _cache_get(f"work:{identifier}")
+        if cached is not None:
+            works[identifier] = cached
+    openalex_ids = [i for i in identifiers if i.startswith("W") and i not in works]
+    for work in await _fetch_works_by_ids(openalex_ids):
+        openalex_id = work.get("id", "").rpartition("/")[2]
+        works[openalex_id] = work
+        _cache_set(f"work:{openalex_id}", work)
+    # DOIs and merged works don't come back from the id filter, look them up one by one
+    missing = [i for i in identifiers if i not in works]
+    for identifier, work in zip(
+        missing, await asyncio.gather(*(fetch_work(i) for i in missing))
+    ):
+        if work:
+            works[identifier] = work
+    return works
+
+
+async def fetch_citing_works(openalex_id: str, max_results: int = 200) -> list[dict]:
+    key = f"citing:{openalex_id}:{max_results}"
+    cached = _cache_get(key)
+    if cached is not None:
+        return cached
 
-    return []
-
-
-def fetch_related_works(openalex_id: str, max_results: int = 50) -> list[dict]:
-    work = fetch_work(openalex_id)
-    if not work:
-        return []
-
-    related_ids = work.get("related_works", [])
-    if not related_ids:
+    url = f"{BASE_URL}/works"
+    per_page = min(max_results, 200)
+
+    def page_params(page: int) -> dict:
+        return {
+            "filter": f"cites:{openalex_id}",
+            "per-page": per_page,
+            "page": page,
+            "sort": "cited_by_count:desc",
+            "select": _NEIGHBOUR_FIELDS,
+        }
+
+    data = await _make_request(url, page_params(1))
+    if not data or "results" not in data:
         return []
-    related_ids = related_ids[:max_results]
-    results = []
-    for i in range(0, len(related_ids), 50):
-        batch = related_ids[i : i + 50]
-        batch_ids = [url.split("/")[-1] if "/" in url else url for url in batch]
-
-        filter_value = "|".join(batch_ids)
-        url = f"{BASE_URL}/works"
-        params = {"filter": f"openalex_id:{filter_value}", "per-page": 50}
-
-        data = _make_request(url, params)
-        if data and "results" in data:
-            results.extend(data["results"])
 
+    results = data["results"]
+    # the first page tells us the total, so the remaining pages can be
+    # requested together (a cursor would force them to go one by one)
+    total = min(max_results, data.get("meta", {}).get("count") or 0)
+    last_page = -(-total // per_page)
+    if last_page > 1:
+        pages = await asyncio.gather(
+            *(_make_request(url, page_params(p)) for p in range(2, last_page + 1))
+        )
+        for page in pages:
+            if page and "results" in page:
+                results.extend(page["results"])
+    results = results[:max_results]
+    _cache_set(key, results)
     return results
 
 
-def search_works(query: str, max_results: int = 25) -> list[dict]:
+async def search_works(query: str, max_results: int = 25) -> list[dict]:
+    key = f"search:{query}:{max_results}"
+    cached = _cache_get(key)
+    if cached is not None:
+        return cached
+
     url = f"{BASE_URL}/works"
     params = {
         "search": query,
         "per-page": min(max_results, 200),
+        "select": _SEARCH_FIELDS,
     }
 
-    return _make_request(url, params)
+    data = await _make_request(url, params)
+    if data:
+        _cache_set(key, data)
+    return data
 
 
-async def _try_download_pdf(url: str, pdf_path: Path) -> bool:
-    # TODO: clean this up and properly download pdfs, for example let users define user agents etc
-    base_headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-        "Accept": "application/pdf,text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
-        "Accept-Language": "en-US,en;q=0.9",
-    }
+_PDF_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Accept": "application/pdf,text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9",
+    "Referer": "https://openalex.org/",
+}
+_PDF_HEADERS_NCBI = _PDF_HEADERS | {"Referer": "https://www.ncbi.nlm.nih.gov/"}
 
-    if "ncbi.nlm.nih.gov" in url or "pmc.ncbi.nlm.nih.gov" in url:
-        base_headers["Referer"] = "https://www.ncbi.nlm.nih.gov/"
+
+async def _try_download_pdf(url: str, pdf_path: Path) -> Optional[bool]:
+    """True when a PDF was saved, False when the url definitely has none
+    (gone or not a PDF), None when the attempt failed in a way worth retrying."""
+    global _ncbi_session_warm
+    # TODO: clean this up and properly download pdfs, for example let users define user agents etc
+    if "ncbi.nlm.nih.gov" in url:
+        base_headers = _PDF_HEADERS_NCBI
     else:
-        base_headers["Referer"] = "https://openalex.org/"
+        base_headers = _PDF_HEADERS
 
-    _rate_limit()
+    await _host_rate_limiter(url).acquire()
 
     try:
-        async with AsyncSession() as session:
-            if "pmc/articles" in url:
-                match = re.search(r"/pmc/articles/(PMC\d+)", url)
-                if match:
-                    pmc_id = match.group(1)
-                    landing_url = f"https://www.ncbi.nlm.nih.gov/pmc/articles/{pmc_id}/"
-                    try:
-                        await session.get(
-                            landing_url,
-                            headers=base_headers,
-                            timeout=30,
-                            impersonate="chrome110",
-                            allow_redirects=True,
-                        )
-                        logger.debug(
-                            f"Established session via landing page: {landing_url}"
-                        )
-                    except Exception as e:
-                        logger.debug(
-                            f"Could not visit landing page, continuing anyway: {e}"
-                        )
-
-            response = await session.get(
-                url,
-                headers=base_headers,
-                timeout=30,
-                impersonate="chrome110",
-                allow_redirects=True,
-                stream=True,
-            )
+        session = _get_pdf_session()
+        # the landing page only sets session cookies, one visit per session is enough
+        if "pmc/articles" in url and not _ncbi_session_warm:
+            match = _PMC_ARTICLE_RE.search(url)
+            if match:
+                pmc_id = match.group(1)
+                landing_url = f"https://www.ncbi.nlm.nih.gov/pmc/articles/{pmc_id}/"
+                try:
+                    landing = await session.get(
+                        landing_url,
+                        headers=base_headers,
+                        timeout=30,
+                        impersonate="chrome110",
+                        allow_redirects=True,
+                    )
+                    if landing.status_code == 200:
+                        _ncbi_session_warm = True
+                    logger.debug(f"Established session via landing page: {landing_url}")
+                except Exception as e:
+                    logger.debug(
+                        f"Could not visit landing page, continuing anyway: {e}"
+                    )
+
+        response = await session.get(
+            url,
+            headers=base_headers,
+            timeout=30,
+            impersonate="chrome110",
+            allow_redirects=True,
+            stream=True,
+        )
 
+        try:
             final_url = getattr(response, "url", url)
             if final_url != url:
                 logger.debug(f"Resolved redirect: {url} -> {final_url}")
 
             if response.status_code == 200:
-                with open(pdf_path, "wb") as f:
-                    async for chunk in response.aiter_content(chunk_size=8192):
+                # landing pages are caught on the first chunk instead of after
+                # downloading the whole body
+                chunks = response.aiter_content(chunk_size=262144)
+                head = b""
+                while (
+                    len(head) < 4 and (chunk := await anext(chunks, None)) is not None
+                ):
+                    head += chunk
+                if head[:4] != b"%PDF":
+                    # the preview is only decoded when DEBUG is actually on
+                    logger.opt(lazy=True).debug(
+                        "Downloaded file is not a valid PDF (magic bytes: {}, preview: {}) for {}",
+                        lambda: repr(head[:4]),
+                        lambda: head[:50].decode("utf-8", errors="ignore"),
+                        lambda: final_url,
+                    )
+                    return False
+
+                # unbuffered writes of large chunks, preallocated when the size is known
+                fd = os.open(
+                    pdf_path,
+                    os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0),
+                    0o644,
+                )
+                try:
+                    size = int(response.headers.get("content-length") or 0)
+                    if size and hasattr(os, "posix_fallocate"):
+                        os.posix_fallocate(fd, 0, size)
+                    written = os.write(fd, head)
+                    async for chunk in chunks:
                         if not chunk:
                             continue
-                        f.write(chunk)
-
-                with open(pdf_path, "rb") as f:
-                    first_bytes = f.read(4)
-                    if first_bytes != b"%PDF":
-                        f.seek(0)
-                        preview = f.read(100).decode("utf-8", errors="ignore")
-                        logger.debug(
-                            f"Downloaded file is not a valid PDF (magic bytes: {first_bytes!r}, preview: {preview[:50]}) for {final_url}"
-                        )
-                        pdf_path.unlink()
-                        return False
+                        written += os.write(fd, chunk)
+                    if written < size:
+                        # body was shorter than advertised, drop the preallocated tail
+                        os.ftruncate(fd, written)
+                finally:
+                    os.close(fd)
 
                 content_type = response.headers.get("content-type", "").lower()
                 if content_type and "application/pdf" not in content_type:
@@ -253,29 +474,39 @@ async def _try_download_pdf(url: str, pdf_path: Path) -> bool:
                 logger.debug(
                     f"Failed to download PDF: {final_url}, status code: {response.status_code}"
                 )
-                return False
-
+                return False if response.status_code in _PDF_GONE_STATUSES else None
+        finally:
+            # streamed responses hold a handle on the shared session until closed
+            await response.aclose()
+
+    except (curl_errors.ConnectionError, curl_errors.Timeout) as e:
+        # the host itself is unreachable, its other urls would stall the same way
+        _dead_hosts[_url_host(url)] = time.monotonic()
+        logger.debug(f"Error downloading PDF: {e} {url}")
+        pdf_path.unlink(missing_ok=True)
     except Exception as e:
         logger.debug(f"Error downloading PDF: {e} {url}")
-        if pdf_path.exists():
-            pdf_path.unlink()
-        pass
+        pdf_path.unlink(missing_ok=True)
 
-    return False
+    return None
 
 
-def _get_biorxiv_pdf_url(doi: str) -> Optional[str]:
+async def _get_biorxiv_pdf_url(doi: str) -> Optional[str]:
     if not doi.startswith("10.1101/"):
-        return None
+        return _NO_PDF
     url = f"https://api.biorxiv.org/details/biorxiv/{doi}"
     try:
-        response = httpx.get(url, timeout=30.0, follow_redirects=True)
+        await _host_rate_limiter(url).acquire()
+        response = await _get_client().get(url)
         if response.status_code == 200:
-            data = response.json()
+            data = orjson.loads(response.content)
             if data.get("collection") and len(data["collection"]) > 0:
                 latest = data["collection"][-1]
                 biorxiv_doi = latest.get("doi", doi)
                 return f"https://www.biorxiv.org/content/{biorxiv_doi}.full.pdf"
+            return _NO_PDF
+        elif response.status_code in _PDF_GONE_STATUSES:
+            return _NO_PDF
         else:
             logger.debug(
                 f"bioRxiv API returned status code {response.status_code} for {doi}"
@@ -285,23 +516,25 @@ def _get_biorxiv_pdf_url(doi: str) -> Optional[str]:
     return None
 
 
-def _get_pmc_pdf_url(pmcid: str) -> Optional[str]:
+async def _get_pmc_pdf_url(pmcid: str) -> Optional[str]:
     if not pmcid:
-        return None
+        return _NO_PDF
     pmcid_clean = pmcid.replace("PMC", "") if pmcid.startswith("PMC") else pmcid
     url = f"https://www.ncbi.nlm.nih.gov/pmc/utils/oa/oa.fcgi?id=PMC{pmcid_clean}"
     try:
-        response = httpx.get(url, timeout=30.0, follow_redirects=True)
+        await _host_rate_limiter(url).acquire()
+        response = await _get_client().get(url)
         if response.status_code == 200:
-            import re
-
-            match = re.search(r'href="(https://[^"]+\.pdf)"', response.text)
+            match = _PMC_HTTPS_PDF_RE.search(response.content)
             if match:
-                return match.group(1)
-            match = re.search(r'href="(ftp://[^"]+\.pdf)"', response.text)
+                return match.group(1).decode()
+            match = _PMC_FTP_PDF_RE.search(response.content)
             if match:
-                ftp_url = match.group(1)
+                ftp_url = match.group(1).decode()
                 return ftp_url.replace("ftp://", "https://")
+            return _NO_PDF
+        elif response.status_code in _PDF_GONE_STATUSES:
+            return _NO_PDF
         else:
             logger.debug(
                 f"PMC API returned status code {response.status_code} for {pmcid}"
@@ -311,19 +544,23 @@ def _get_pmc_pdf_url(pmcid: str) -> Optional[str]:
     return None
 
 
-def _get_unpaywall_pdf_url(doi: str) -> Optional[str]:
-    email = os.environ.get("OPENALEX_EMAIL", "user@example.com")
+async def _get_unpaywall_pdf_url(doi: str) -> Optional[str]:
+    email = _EMAIL or "user@example.com"
     url = f"https://api.unpaywall.org/v2/{doi}?email={email}"
     try:
-        response = httpx.get(url, timeout=30.0, follow_redirects=True)
+        await _host_rate_limiter(url).acquire()
+        response = await _get_client().get(url)
         if response.status_code == 200:
-            data = response.json()
+            data = orjson.loads(response.content)
             best = data.get("best_oa_location", {})
             if best and best.get("url_for_pdf"):
                 return best["url_for_pdf"]
             for loc in data.get("oa_locations", []):
                 if loc.get("url_for_pdf"):
                     return loc["url_for_pdf"]
+            return _NO_PDF
+        elif response.status_code in _PDF_GONE_STATUSES:
+            return _NO_PDF
         else:
             logger.debug(
                 f"Unpaywall API returned status code {response.status_code} for {doi}"
@@ -333,82 +570,176 @@ def _get_unpaywall_pdf_url(doi: str) -> Optional[str]:
     return None
 
 
+async def _resolve_cached(key: str, resolver, arg: str) -> Optional[str]:
+    # resolvers return _NO_PDF when the API answered without a pdf and None when
+    # the lookup itself failed; only hits are cached
+    cached = _cache_get(key)
+    if cached is not None:
+        return cached
+    url = await resolver(arg)
+    if url:
+        _cache_set(key, url)
+    return url
+
+
+def _host_is_dead(host: str) -> bool:
+    dead_since = _dead_hosts.get(host)
+    return dead_since is not None and time.monotonic() - dead_since < _dead_host_ttl
+
+
+async def _attempt_pdf(
+    source, tmp_path: Path, claimed: set[str]
+) -> tuple[Optional[Path], bool]:
+    """Returns (path, definite): the downloaded file if any, and whether a miss
+    is a real answer rather than an error that might go away on retry."""
+    # `source` is either a url or a resolver coroutine that returns one
+    if isinstance(source, str):
+        url = source
+    else:
+        url = await source
+        if url is None:
+            return None, False
+        if not url or url in claimed:
+            # no pdf known, or another attempt already owns this url
+            return None, True
+        claimed.add(url)
+    host = _url_host(url)
+    if _host_is_dead(host):
+        logger.debug(f"Skipping {url}, {host} was unreachable recently")
+        return None, False
+    async with _get_pdf_semaphore(), _pdf_host_semaphores[host]:
+        ok = await _try_download_pdf(url, tmp_path)
+    if ok:
+        return tmp_path, True
+    logger.debug(f"Downloading {url} failed")
+    return None, ok is False
+
+
+async def _download_first(sources: list, pdf_path: Path) -> Optional[bool]:
+    """Try every candidate at once and keep the first valid PDF.
+
+    Returns True on success, False when every source definitely has no PDF
+    and None when at least one failed for a possibly transient reason.
+    """
+    if not sources:
+        return False
+    # resolvers often point back at a url we're already trying
+    claimed = {source for source in sources if isinstance(source, str)}
+    tmp_paths = [
+        pdf_path.with_name(f"{pdf_path.name}.{i}.part") for i in range(len(sources))
+    ]
+    tasks = [
+        asyncio.ensure_future(_attempt_pdf(source, tmp_path, claimed))
+        for source, tmp_path in zip(sources, tmp_paths)
+    ]
+    winner = None
+    definite = True
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            winner, answered = await next_done
+            if winner:
+                break
+            definite = definite and answered
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if winner is not None:
+            os.replace(winner, pdf_path)
+        for tmp_path in tmp_paths:
+            tmp_path.unlink(missing_ok=True)
+    if winner is not None:
+        return True
+    return False if definite else None
+
+
+def _pdf_filename(work: dict) -> str:
+    openalex_id = work.get("id", "").rpartition("/")[2]
+    doi = work.get("doi") or ""
+    return f"{openalex_id or doi.rpartition('doi.org/')[2].replace('/', '_')}.pdf"
+
+
+def has_pdf_candidate(work: dict) -> bool:
+    """Guess, without any request, whether fetch_pdf is worth racing against.
+
+    False when every source failed recently or the record lists no PDF link
+    or PMC page; resolvers may still find one, this is only a cheap hint.
+    """
+    if _cache_get(f"pdf_failed:{_pdf_filename(work)}") is not None:
+        return False
+    locations = [
+        work.get("primary_location") or {},
+        work.get("best_oa_location") or {},
+        *work.get("locations", []),
+    ]
+    return any(
+        loc.get("pdf_url") or "pmc/articles" in (loc.get("landing_page_url") or "")
+        for loc in locations
+    )
+
+
 async def fetch_pdf(work: dict, project_dir: Path) -> Optional[Path]:
     # TODO: clean this up
-    openalex_id = (
-        work.get("id", "").split("/")[-1]
-        if "/" in work.get("id", "")
-        else work.get("id", "")
-    )
+    openalex_id = work.get("id", "").rpartition("/")[2]
     doi = work.get("doi", "")
-    doi_bare = doi.split("doi.org/")[-1] if doi and "doi.org/" in doi else doi
+    doi_bare = doi.rpartition("doi.org/")[2] if doi else doi
 
-    filename = f"{openalex_id or doi_bare.replace('/', '_')}.pdf"
+    filename = _pdf_filename(work)
     pdf_dir = project_dir / "pdfs"
     pdf_dir.mkdir(parents=True, exist_ok=True)
     pdf_path = pdf_dir / filename
 
     if pdf_path.exists():
         return pdf_path
+    # every source failed recently, don't hit them all again on a resumed crawl
+    if _cache_get(f"pdf_failed:{filename}") is not None:
+        logger.debug(f"Skipping {filename}, all PDF sources failed recently")
+        return None
 
-    pdf_urls = []
+    # insertion-ordered and deduplicated as we go
+    pdf_urls: dict[str, None] = {}
     pmcid = None
 
     primary = work.get("primary_location", {})
     if primary and primary.get("pdf_url"):
-        pdf_urls.append(primary["pdf_url"])
+        pdf_urls[primary["pdf_url"]] = None
 
     best_oa = work.get("best_oa_location", {})
     if best_oa and best_oa.get("pdf_url"):
-        pdf_urls.append(best_oa["pdf_url"])
+        pdf_urls[best_oa["pdf_url"]] = None
 
     for loc in work.get("locations", []):
         if loc.get("pdf_url"):
-            pdf_urls.append(loc["pdf_url"])
+            pdf_urls[loc["pdf_url"]] = None
         landing = loc.get("landing_page_url") or ""
         if "pmc/articles" in landing:
-            pmc_id = landing.split("/")[-1]
-            pdf_urls.append(
-                f"https://www.ncbi.nlm.nih.gov/pmc/articles/PMC{pmc_id}/pdf/"
-            )
+            pmc_id = landing.rpartition("/")[2]
+            pmc_url = f"https://www.ncbi.nlm.nih.gov/pmc/articles/PMC{pmc_id}/pdf/"
+            pdf_urls[pmc_url] = None
             if not pmcid:
                 pmcid = pmc_id
 
-    pdf_urls = list(dict.fromkeys(pdf_urls))
-    logger.debug(f"found pdf urls {pdf_urls}")
-    for url in pdf_urls:
-        if await _try_download_pdf(url, pdf_path):
-            logger.debug(f"Downloaded: {pdf_path}")
-            return pdf_path
-        else:
-            logger.debug(f"Downloading {url} failed")
-
+    logger.debug(f"found pdf urls {list(pdf_urls)}")
+    # the resolver APIs live on other hosts, so query them alongside the direct urls
+    sources: list = list(pdf_urls)
     if doi_bare and doi_bare.startswith("10.1101/"):
-        biorxiv_url = _get_biorxiv_pdf_url(doi_bare)
-        if biorxiv_url:
-            if await _try_download_pdf(biorxiv_url, pdf_path):
-                logger.debug(f"Downloaded via bioRxiv API: {pdf_path}")
-                return pdf_path
-            else:
-                logger.debug(f"Downloading {biorxiv_url} failed")
-
+        sources.append(
+            _resolve_cached(f"biorxiv:{doi_bare}", _get_biorxiv_pdf_url, doi_bare)
+        )
     if pmcid:
-        pmc_url = _get_pmc_pdf_url(pmcid)
-        if pmc_url:
-            if await _try_download_pdf(pmc_url, pdf_path):
-                logger.debug(f"Downloaded via PMC OA API: {pdf_path}")
-                return pdf_path
-            else:
-                logger.debug(f"Downloading {pmc_url} failed")
-
+        sources.append(_resolve_cached(f"pmc:{pmcid}", _get_pmc_pdf_url, pmcid))
     if doi_bare:
-        unpaywall_url = _get_unpaywall_pdf_url(doi_bare)
-        if unpaywall_url:
-            if await _try_download_pdf(unpaywall_url, pdf_path):
-                logger.debug(f"Downloaded via Unpaywall: {pdf_path}")
-                return pdf_path
-            else:
-                logger.debug(f"Downloading {unpaywall_url} failed")
+        sources.append(
+            _resolve_cached(f"unpaywall:{doi_bare}", _get_unpaywall_pdf_url, doi_bare)
+        )
+
+    downloaded = await _download_first(sources, pdf_path)
+    if downloaded:
+        logger.debug(f"Downloaded: {pdf_path}")
+        return pdf_path
 
     logger.debug(f"Could not download PDF for {openalex_id}")
+    # errors and unreachable hosts may clear up, so only remember real misses
+    if downloaded is False:
+        _cache_set(f"pdf_failed:{filename}", list(pdf_urls))
     return None
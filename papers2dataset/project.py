@@ -1,7 +1,9 @@
-import json
+import functools
 from pathlib import Path
 from typing import Any
 
+import orjson
+
 
 def list_project_files(project_dir):
     # TODO: clean up
@@ -13,21 +15,50 @@ def list_project_files(project_dir):
 
 
 def load_assets(project_dir):
-    schema_path, prompt_path, relevance_prompt_path, search_query_path = (
-        list_project_files(project_dir)
-    )
-    with open(schema_path, "r") as f:
-        schema = json.load(f)
-    with open(prompt_path, "r") as f:
-        prompt = f.read().strip()
-    with open(relevance_prompt_path, "r") as f:
-        relevance_prompt = f.read().strip()
-    with open(search_query_path, "r") as f:
-        search_query = f.read().strip()
+    # keyed on mtimes so edits to the prompt files mid-run are still picked up
+    paths = list_project_files(Path(project_dir).resolve())
+    return _load_assets_cached(paths, tuple(p.stat().st_mtime_ns for p in paths))
+
+
+@functools.lru_cache(maxsize=8)
+def _load_assets_cached(paths, mtimes):
+    schema_path, prompt_path, relevance_prompt_path, search_query_path = paths
+    schema = orjson.loads(schema_path.read_bytes())
+    prompt = prompt_path.read_text().strip()
+    relevance_prompt = relevance_prompt_path.read_text().strip()
+    search_query = search_query_path.read_text().strip()
 
     return schema, prompt, relevance_prompt, search_query
 
 
+def load_keywords(project_dir) -> tuple[list[str], list[str]]:
+    """Keyword pre-filter lists; empty when the project predates keywords.json."""
+    path = Path(project_dir).resolve() / "keywords.json"
+    try:
+        mtime = path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return [], []
+    return _load_keywords_cached(path, mtime)
+
+
+@functools.lru_cache(maxsize=8)
+def _load_keywords_cached(path, mtime):
+    data = orjson.loads(path.read_bytes())
+    return data.get("keywords", []), data.get("negative_keywords", [])
+
+
+def canonical_schema(project_dir) -> str:
+    """Key-sorted JSON of the project's schema, for use in cache keys."""
+    schema_path = list_project_files(Path(project_dir).resolve())[0]
+    return _canonical_schema_cached(schema_path, schema_path.stat().st_mtime_ns)
+
+
+@functools.lru_cache(maxsize=8)
+def _canonical_schema_cached(schema_path, mtime):
+    schema = orjson.loads(schema_path.read_bytes())
+    return orjson.dumps(schema, option=orjson.OPT_SORT_KEYS).decode()
+
+
 def create_project(project_name: str) -> Path:
     projects_dir = Path("projects")
     project_dir = projects_dir / project_name
@@ -38,17 +69,27 @@ def create_project(project_name: str) -> Path:
 
 
 def save_project_assets(project_dir: Path, assets: dict[str, Any]) -> None:
-    with open(project_dir / "schema.json", "w") as f:
-        json.dump(assets["schema"], f, indent=2)
+    (project_dir / "schema.json").write_bytes(
+        orjson.dumps(assets["schema"], option=orjson.OPT_INDENT_2)
+    )
     with open(project_dir / "prompt.txt", "w") as f:
         f.write(assets["prompt"])
     with open(project_dir / "search_query.txt", "w") as f:
         f.write(assets["search_query"])
     with open(project_dir / "relevance_prompt.txt", "w") as f:
         f.write(assets["relevance_prompt"])
+    if assets.get("keywords"):
+        keywords = {
+            "keywords": assets["keywords"],
+            "negative_keywords": assets.get("negative_keywords", []),
+        }
+        (project_dir / "keywords.json").write_bytes(
+            orjson.dumps(keywords, option=orjson.OPT_INDENT_2)
+        )
     metadata = {
         "model_used": assets.get("model_used", "unknown"),
         "description": assets.get("description", ""),
     }
-    with open(project_dir / "metadata.json", "w") as f:
-        json.dump(metadata, f, indent=2)
+    (project_dir / "metadata.json").write_bytes(
+        orjson.dumps(metadata, option=orjson.OPT_INDENT_2)
+    )
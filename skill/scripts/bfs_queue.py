@@ -15,9 +15,10 @@ Usage:
 """
 
 import json
-from collections import deque
+import os
+from collections import OrderedDict
 from pathlib import Path
-from typing import Optional
+from typing import Iterable, Optional
 
 
 class BFSQueue:
@@ -25,7 +26,8 @@ class BFSQueue:
 
     def __init__(self, path: Path = Path("bfs_queue.json")):
         self.path = path
-        self.queue: deque[str] = deque()
+        # ordered like a deque, but ids can also be dropped from the middle in O(1)
+        self.queue: OrderedDict[str, None] = OrderedDict()
         self.processed: set[str] = set()
         self.skipped: dict[str, str] = {}
         self.in_progress: set[str] = set()
@@ -33,23 +35,44 @@ class BFSQueue:
         self._load_if_exists()
 
     def _load_if_exists(self):
-        if self.path.exists():
-            with open(self.path) as f:
-                data = json.load(f)
-            self.queue = deque(data.get("queue", []))
-            self.processed = set(data.get("processed", []))
-            self.skipped = data.get("skipped", {})
-            self.failed = data.get("failed", {})
+        try:
+            with open(self.path, "rb") as f:
+                data = json.loads(f.read())
+        except FileNotFoundError:
+            return
+        self.processed = set(data.get("processed", []))
+        self.skipped = data.get("skipped", {})
+        self.failed = data.get("failed", {})
+        self.queue = OrderedDict.fromkeys(
+            pid
+            for pid in data.get("queue", [])
+            if pid not in self.processed
+            and pid not in self.skipped
+            and pid not in self.failed
+        )
 
     def _save(self):
+        # write-through: agents read and hand-edit bfs_queue.json between
+        # script runs, so in-memory state must never lag behind the file
         data = {
             "queue": list(self.queue),
             "processed": list(self.processed),
             "skipped": self.skipped,
             "failed": self.failed,
         }
-        with open(self.path, "w") as f:
-            json.dump(data, f, indent=2)
+        if os.environ.get("P2D_QUEUE_PRETTY"):
+            payload = json.dumps(data, indent=2)
+        else:
+            payload = json.dumps(data, separators=(",", ":"))
+        # write-then-rename so an interrupted save never leaves a truncated file
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.write(fd, payload.encode())
+            getattr(os, "fdatasync", os.fsync)(fd)
+        finally:
+            os.close(fd)
+        os.replace(tmp_path, self.path)
 
     def add(self, paper_id: str) -> bool:
         """Add a single paper ID to the queue."""
@@ -59,54 +82,59 @@ class BFSQueue:
             return False
         if paper_id in self.queue:
             return False
-        self.queue.append(paper_id)
+        self.queue[paper_id] = None
         self._save()
         return True
 
-    def add_many(self, paper_ids: list[str]) -> int:
+    def add_many(self, paper_ids: Iterable[str]) -> int:
         """Add multiple paper IDs, skipping duplicates. Returns count added."""
-        existing = (
-            set(self.queue)
-            | self.processed
-            | set(self.skipped.keys())
-            | set(self.failed.keys())
+        # dict.fromkeys drops repeats within the batch and keeps their order
+        new_ids = dict.fromkeys(
+            pid
+            for pid in paper_ids
+            if pid
+            and pid not in self.queue
+            and pid not in self.processed
+            and pid not in self.skipped
+            and pid not in self.failed
         )
-        added = 0
-        for pid in paper_ids:
-            if pid and pid not in existing:
-                self.queue.append(pid)
-                existing.add(pid)
-                added += 1
-        if added > 0:
+        if new_ids:
+            self.queue.update(new_ids)
             self._save()
-        return added
+        return len(new_ids)
+
+    def peek(self) -> Optional[str]:
+        """Return the next paper ID without removing it."""
+        return next(iter(self.queue), None)
 
     def pop(self) -> Optional[str]:
         """Pop the next paper ID from the queue."""
-        while self.queue:
-            pid = self.queue.popleft()
-            if pid not in self.processed and pid not in self.skipped:
-                self.in_progress.add(pid)
-                self._save()
-                return pid
-        return None
+        if not self.queue:
+            return None
+        pid, _ = self.queue.popitem(last=False)
+        self.in_progress.add(pid)
+        self._save()
+        return pid
 
     def mark_processed(self, paper_id: str):
         """Mark a paper as successfully processed."""
         self.processed.add(paper_id)
         self.in_progress.discard(paper_id)
+        self.queue.pop(paper_id, None)
         self._save()
 
     def mark_skipped(self, paper_id: str, reason: str):
         """Mark a paper as skipped (not relevant)."""
         self.skipped[paper_id] = reason
         self.in_progress.discard(paper_id)
+        self.queue.pop(paper_id, None)
         self._save()
 
     def mark_failed(self, paper_id: str, reason: str):
         """Mark a paper as failed (couldn't process)."""
         self.failed[paper_id] = reason
         self.in_progress.discard(paper_id)
+        self.queue.pop(paper_id, None)
         self._save()
 
     def status(self) -> dict:
@@ -3,13 +3,18 @@
 
 Usage:
     python search_openalex.py "cryoprotectant toxicity" --output bfs_queue.json --max-results 25
+    python search_openalex.py --queries-file queries.txt --output bfs_queue.json
 """
 
 import argparse
+import functools
+import hashlib
 import json
 import os
 import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Optional
 
@@ -22,60 +27,137 @@ except ImportError:
     )
     sys.exit(1)
 
+from bfs_queue import BFSQueue
 
 BASE_URL = "https://api.openalex.org"
-_last_request = 0
+# raw search pages are kept for a day so repeating a query skips the network
+_CACHE_DIR = Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "openalex"
+_CACHE_TTL = 24 * 3600
+# one pooled client so cursor pages reuse the same TLS connection
+_client = httpx.Client(timeout=30.0, follow_redirects=True)
+
+
+class TokenBucket:
+    """Allow bursts of up to `capacity` requests while keeping `rate` per second on average."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.ts = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        # reserve under the lock, sleep outside it so other threads can queue up
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.ts) * self.rate)
+            self.ts = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate
+        if wait > 0:
+            time.sleep(wait)
+
+
+# OpenAlex polite pool allows 10 req/s with an email, 1 req/s without
+_buckets = {
+    True: TokenBucket(rate=10, capacity=10),
+    False: TokenBucket(rate=1, capacity=1),
+}
 
 
 def _rate_limit(has_email: bool):
-    global _last_request
-    min_interval = 0.1 if has_email else 1.0
-    elapsed = time.time() - _last_request
-    if elapsed < min_interval:
-        time.sleep(min_interval - elapsed)
-    _last_request = time.time()
+    _buckets[has_email].acquire()
+
+
+def _get_page(params: dict, has_email: bool) -> Optional[bytes]:
+    """Return the raw JSON body for one /works page, from the disk cache if fresh."""
+    # mailto only picks the rate pool, it doesn't change the results
+    key_params = sorted((k, str(v)) for k, v in params.items() if k != "mailto")
+    key = hashlib.sha256(repr(key_params).encode()).hexdigest()
+    cache_path = _CACHE_DIR / f"{key}.json"
+    try:
+        if time.time() - cache_path.stat().st_mtime < _CACHE_TTL:
+            return cache_path.read_bytes()
+    except OSError:
+        pass
+
+    _rate_limit(has_email)
+    response = _client.get(f"{BASE_URL}/works", params=params)
+    if response.status_code != 200:
+        print(f"Error: API returned status {response.status_code}", file=sys.stderr)
+        return None
+
+    try:
+        _CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_suffix(".tmp")
+        tmp_path.write_bytes(response.content)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        pass  # caching is best effort
+    return response.content
 
 
 def search_works(
-    query: str, max_results: int = 25, email: Optional[str] = None
+    query: str,
+    max_results: int = 25,
+    email: Optional[str] = None,
+    select: Optional[str] = "id",
 ) -> list[dict]:
-    """Search OpenAlex for works matching the query."""
+    """Search OpenAlex for works matching the query, following cursor pages past 200.
+
+    Only the fields in `select` are returned (just the id by default, which is all
+    the queue needs); pass None for full work records.
+    """
     email = email or os.environ.get("OPENALEX_EMAIL")
-    _rate_limit(bool(email))
 
-    params = {"search": query, "per-page": min(max_results, 200)}
+    # per-page stays fixed across a cursor walk; the last page is trimmed instead
+    params = {"search": query, "per-page": min(max_results, 200), "cursor": "*"}
+    if select:
+        params["select"] = select
     if email:
         params["mailto"] = email
 
-    url = f"{BASE_URL}/works?" + "&".join(f"{k}={v}" for k, v in params.items())
-    response = httpx.get(url, timeout=30.0, follow_redirects=True)
-
-    if response.status_code != 200:
-        print(f"Error: API returned status {response.status_code}", file=sys.stderr)
-        return []
-
-    return response.json().get("results", [])
+    results = []
+    while params["cursor"] and len(results) < max_results:
+        body = _get_page(params, bool(email))
+        if body is None:
+            break
 
+        data = json.loads(body)
+        page = data.get("results", [])
+        if not page:
+            break
+        results.extend(page)
+        params["cursor"] = data.get("meta", {}).get("next_cursor")
 
-def load_queue(path: Path) -> dict:
-    """Load existing queue or create empty one."""
-    if path.exists():
-        with open(path) as f:
-            return json.load(f)
-    return {"queue": [], "processed": [], "skipped": {}, "failed": {}}
+    return results[:max_results]
 
 
-def save_queue(path: Path, data: dict):
-    """Save queue to file."""
-    with open(path, "w") as f:
-        json.dump(data, f, indent=2)
+@functools.lru_cache(maxsize=256)
+def search_ids(
+    query: str, max_results: int = 25, email: Optional[str] = None
+) -> tuple[str, ...]:
+    """Return the OpenAlex work ids for a query, memoized for the life of the process."""
+    paper_ids = []
+    for work in search_works(query, max_results, email):
+        oa_id = work.get("id", "").rpartition("/")[2]
+        if oa_id.startswith("W"):
+            paper_ids.append(oa_id)
+    return tuple(paper_ids)
 
 
 def main():
     parser = argparse.ArgumentParser(
         description="Search OpenAlex and populate BFS queue"
     )
-    parser.add_argument("query", help="Search query")
+    parser.add_argument("query", nargs="?", help="Search query")
+    parser.add_argument(
+        "--queries-file",
+        "-q",
+        type=Path,
+        help="File with one search query per line, searched concurrently",
+    )
     parser.add_argument(
         "--output",
         "-o",
@@ -90,41 +172,41 @@ def main():
 
     args = parser.parse_args()
 
-    print(f"Searching OpenAlex for: {args.query}")
-    results = search_works(args.query, args.max_results, args.email)
-
-    if not results:
+    queries = [args.query] if args.query else []
+    if args.queries_file:
+        queries += [
+            line.strip()
+            for line in args.queries_file.read_text().splitlines()
+            if line.strip()
+        ]
+    if not queries:
+        parser.error("give a query or --queries-file")
+
+    for query in queries:
+        print(f"Searching OpenAlex for: {query}")
+
+    # the token bucket keeps the pool inside OpenAlex's rate limit
+    with ThreadPoolExecutor(max_workers=10) as pool:
+        per_query = pool.map(
+            lambda q: search_ids(q, args.max_results, args.email), queries
+        )
+        paper_ids = []
+        for query, ids in zip(queries, per_query):
+            if len(queries) > 1:
+                print(f"{query}: {len(ids)} results")
+            paper_ids.extend(ids)
+
+    if not paper_ids:
         print("No results found.")
         return
 
-    # Extract OpenAlex IDs
-    paper_ids = []
-    for work in results:
-        oa_id = work.get("id", "").split("/")[-1]
-        if oa_id.startswith("W"):
-            paper_ids.append(oa_id)
-
     print(f"Found {len(paper_ids)} papers")
 
-    # Load existing queue and add new IDs
-    queue_data = load_queue(args.output)
-    existing = (
-        set(queue_data["queue"])
-        | set(queue_data["processed"])
-        | set(queue_data["skipped"].keys())
-        | set(queue_data["failed"].keys())
-    )
-
-    added = 0
-    for pid in paper_ids:
-        if pid not in existing:
-            queue_data["queue"].append(pid)
-            existing.add(pid)
-            added += 1
-
-    save_queue(args.output, queue_data)
+    # the shared queue skips known ids with set lookups and writes atomically
+    queue = BFSQueue(args.output)
+    added = queue.add_many(paper_ids)
     print(f"Added {added} new papers to queue: {args.output}")
-    print(f"Queue now has {len(queue_data['queue'])} pending papers")
+    print(f"Queue now has {len(queue.queue)} pending papers")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,28 @@
+import orjson
+import pytest
+
+from papers2dataset.export_csv import export_parquet
+
+
+def test_parquet_keeps_keys_only_later_files_have(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    (tmp_path / "a.json").write_bytes(orjson.dumps({"items": [{"name": "x"}]}))
+    (tmp_path / "b.json").write_bytes(
+        orjson.dumps({"model": "m", "items": [{"name": "y", "temp_c": -80}]})
+    )
+
+    table = pq.read_table(export_parquet(tmp_path))
+
+    assert {"record_temp_c", "file_model"} <= set(table.column_names)
+    assert table.column("record_temp_c").to_pylist() == [None, -80]
+
+
+def test_parquet_stores_empty_nested_objects_as_json(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    (tmp_path / "a.json").write_bytes(
+        orjson.dumps({"items": [{"name": "x", "extra": {}}]})
+    )
+
+    table = pq.read_table(export_parquet(tmp_path))
+
+    assert table.column("record_extra").to_pylist() == ["{}"]
@@ -0,0 +1,29 @@
+import asyncio
+
+import httpx
+
+from papers2dataset import openalex_client as oc
+
+
+def test_citing_works_fetches_remaining_pages(monkeypatch):
+    pages = []
+
+    def handler(request):
+        page = int(request.url.params["page"])
+        pages.append(page)
+        results = [{"id": f"https://openalex.org/W{page}{i:03}"} for i in range(200)]
+        return httpx.Response(200, json={"meta": {"count": 1234}, "results": results})
+
+    async def run():
+        monkeypatch.setattr(
+            oc, "_client", httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        )
+        monkeypatch.setattr(oc, "_rate_limiter", oc.TokenBucket(rate=1e9, capacity=1e9))
+        monkeypatch.setattr(oc, "_works_cache", None)
+        return await oc.fetch_citing_works("W1", max_results=500)
+
+    works = asyncio.run(run())
+
+    assert sorted(pages) == [1, 2, 3]
+    assert len(works) == 500
+    assert works[-1]["id"] == "https://openalex.org/W3099"